@@ -5,18 +5,21 @@ No external dependencies beyond standard Python libraries (Tkinter for GUI).
 """
 
 import sys
-import termios
 import os
 import time
 import atexit
 import signal
 import argparse
-from tkinter import *
-from tkinter import filedialog
-from tkinter import messagebox
-from tkinter import ttk
+import bisect
+import io
+from array import array, typecodes
 import re
-import platform # <-- IMPORTED FOR OS DETECTION
+from collections import OrderedDict
+
+# Imported by the mode that needs them: termios by enable_raw_mode() (it's
+# Unix-only, so the GUI still starts on Windows), Tkinter and platform by run_gui()
+termios = None
+tk = filedialog = messagebox = ttk = platform = None
 
 NOVA_VERSION = "0.0.5"  # Refactored syntax highlighting and pure CLI
 
@@ -34,6 +37,8 @@ HL_MATCH = 8
 HL_HIGHLIGHT_STRINGS = 1 << 0
 HL_HIGHLIGHT_NUMBERS = 1 << 1
 
+HL_CACHE_SIZE = 4096  # Max (line hash, open_comment) entries kept in E.hl_cache
+
 class EditorSyntax:
     def __init__(self, file_extensions, keywords, singleline_comment_start, multiline_comment_start, multiline_comment_end, flags):
         self.file_extensions = file_extensions
@@ -42,6 +47,44 @@ class EditorSyntax:
         self.multiline_comment_start = multiline_comment_start
         self.multiline_comment_end = multiline_comment_end
         self.flags = flags
+        # Keywords ending in '|' are type keywords; plain keywords win on duplicates
+        self.keyword_hl = {kw[:-1]: HL_KEYWORD2 for kw in keywords if kw.endswith('|')}
+        self.keyword_hl.update((kw, HL_KEYWORD1) for kw in keywords if not kw.endswith('|'))
+        self.token_re = compile_tokenizer(self)
+        self.comment_re = compile_tokenizer(self, comments_only=True)
+
+SEPARATORS = ",.()+-/*=~%[];"
+
+def compile_tokenizer(syntax, comments_only=False):
+    """Build the master regex used by get_syntax_highlighting for `syntax`.
+
+    Each alternative is a named group: single-line comment, multi-line
+    comment start, string literal, number and identifier. Anything the
+    regex skips over is plain text. No token but a multi-line comment
+    crosses a newline, so several lines can be scanned in one pass.
+
+    With `comments_only`, numbers and identifiers are left out when no
+    comment delimiter could start inside one: that is all it takes to find
+    where multi-line comments open and close.
+    """
+    delimiters = (syntax.singleline_comment_start or '') + (syntax.multiline_comment_start or '')
+    if comments_only and re.search(r'[\w.]', delimiters):
+        comments_only = False
+    parts = []
+    if syntax.singleline_comment_start:
+        parts.append(r'(?P<slc>' + re.escape(syntax.singleline_comment_start) + r'[^\n]*)')
+    if syntax.multiline_comment_start:
+        parts.append(r'(?P<mlc>' + re.escape(syntax.multiline_comment_start) + r')')
+    if syntax.flags & HL_HIGHLIGHT_STRINGS:
+        # Unterminated strings run to the end of the line
+        parts.append(r'(?P<str>"(?:[^"\\\n]|\\[^\n]?)*"?|\'(?:[^\'\\\n]|\\[^\n]?)*\'?)')
+    if comments_only:
+        return re.compile('|'.join(parts))
+    if syntax.flags & HL_HIGHLIGHT_NUMBERS:
+        # A number starts after a separator and runs over digits and dots
+        parts.append(r'(?P<num>(?<![^\s\0' + re.escape(SEPARATORS) + r'])\d[\d.]*)')
+    parts.append(r'(?P<id>[^\W\d]\w*)')
+    return re.compile('|'.join(parts))
 
 # Define syntaxes
 C_EXTENSIONS = [".c", ".h", ".cpp", ".hpp", ".cc"]
@@ -90,6 +133,190 @@ SYNTAX_DB = [
     EditorSyntax(PY_EXTENSIONS, PY_KEYWORDS, "#", "", "", HL_HIGHLIGHT_STRINGS | HL_HIGHLIGHT_NUMBERS)
 ]
 
+ROPE_LEAF_SIZE = 32    # Max rows held by a single leaf chunk
+ROPE_BRANCH_SIZE = 16  # Max children of an internal node
+
+class _RopeNode:
+    """A rope node. Leaves hold a tuple of rows, internal nodes a tuple of
+    children plus the starting row offset of each child. Nodes are never
+    mutated once built, so old versions of the rope stay valid."""
+    __slots__ = ('leaf', 'items', 'offsets', 'size')
+
+    def __init__(self, leaf, items):
+        self.leaf = leaf
+        self.items = items
+        if leaf:
+            self.offsets = None
+            self.size = len(items)
+        else:
+            offsets = []
+            size = 0
+            for child in items:
+                offsets.append(size)
+                size += child.size
+            self.offsets = offsets
+            self.size = size
+
+def _rope_split_items(leaf, items):
+    """Pack `items` into as few evenly filled sibling nodes as possible."""
+    limit = ROPE_LEAF_SIZE if leaf else ROPE_BRANCH_SIZE
+    count = (len(items) + limit - 1) // limit
+    if count <= 1:
+        return [_RopeNode(leaf, tuple(items))]
+    step, extra = divmod(len(items), count)
+    nodes = []
+    start = 0
+    for i in range(count):
+        end = start + step + (1 if i < extra else 0)
+        nodes.append(_RopeNode(leaf, tuple(items[start:end])))
+        start = end
+    return nodes
+
+def _rope_rebalance(leaf, nodes):
+    """Merge underfull siblings into their neighbours, re-splitting on overflow."""
+    limit = ROPE_LEAF_SIZE if leaf else ROPE_BRANCH_SIZE
+    nodes = [node for node in nodes if node.items]
+    i = 0
+    while i < len(nodes) and len(nodes) > 1:
+        if len(nodes[i].items) >= limit // 2:
+            i += 1
+            continue
+        j = i + 1 if i + 1 < len(nodes) else i - 1
+        lo, hi = min(i, j), max(i, j)
+        merged = _rope_split_items(leaf, nodes[lo].items + nodes[hi].items)
+        nodes[lo:hi + 1] = merged
+        i = lo if len(merged) == 1 else lo + len(merged)
+    return nodes
+
+def _rope_insert(node, index, row):
+    if node.leaf:
+        items = node.items[:index] + (row,) + node.items[index:]
+        return _rope_split_items(True, items)
+    k = bisect.bisect_right(node.offsets, index) - 1
+    children = list(node.items)
+    children[k:k + 1] = _rope_insert(children[k], index - node.offsets[k], row)
+    return _rope_split_items(False, children)
+
+def _rope_delete(node, start, end):
+    if node.leaf:
+        return _RopeNode(True, node.items[:start] + node.items[end:])
+    children = []
+    for child, offset in zip(node.items, node.offsets):
+        lo = max(start - offset, 0)
+        hi = min(end - offset, child.size)
+        if lo >= hi:
+            children.append(child)
+        elif lo > 0 or hi < child.size:
+            children.append(_rope_delete(child, lo, hi))
+    children = _rope_rebalance(node.items[0].leaf, children)
+    return _RopeNode(False, tuple(children))
+
+def _rope_replace(node, index, row):
+    if node.leaf:
+        items = list(node.items)
+        items[index] = row
+        return _RopeNode(True, tuple(items))
+    k = bisect.bisect_right(node.offsets, index) - 1
+    children = list(node.items)
+    children[k] = _rope_replace(children[k], index - node.offsets[k], row)
+    return _RopeNode(False, tuple(children))
+
+def _rope_collect(node, start, end, out):
+    if node.leaf:
+        out.extend(node.items[start:end])
+        return
+    for child, offset in zip(node.items, node.offsets):
+        lo = max(start - offset, 0)
+        hi = min(end - offset, child.size)
+        if lo < hi:
+            _rope_collect(child, lo, hi, out)
+
+class Rope:
+    """Persistent height-balanced B-tree of editor rows.
+
+    Every edit returns a new Rope that shares all untouched subtrees with
+    the old one, so keeping a previous version around (for undo) costs a
+    single reference instead of a copy of the whole buffer.
+    """
+    __slots__ = ('root',)
+
+    def __init__(self, root=None):
+        self.root = root if root is not None else _RopeNode(True, ())
+
+    @classmethod
+    def from_rows(cls, rows):
+        nodes = _rope_split_items(True, list(rows))
+        while len(nodes) > 1:
+            nodes = _rope_split_items(False, nodes)
+        return cls(nodes[0])
+
+    @property
+    def line_count(self):
+        return self.root.size
+
+    def __len__(self):
+        return self.root.size
+
+    def line(self, index):
+        if index < 0:
+            index += self.root.size
+        if not 0 <= index < self.root.size:
+            raise IndexError("rope index out of range")
+        node = self.root
+        while not node.leaf:
+            k = bisect.bisect_right(node.offsets, index) - 1
+            index -= node.offsets[k]
+            node = node.items[k]
+        return node.items[index]
+
+    __getitem__ = line
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    def iter_from(self, start):
+        stack = [(self.root, start)]
+        while stack:
+            node, skip = stack.pop()
+            if node.leaf:
+                yield from node.items[skip:]
+                continue
+            k = bisect.bisect_right(node.offsets, skip) - 1 if skip else 0
+            for child in reversed(node.items[k + 1:]):
+                stack.append((child, 0))
+            stack.append((node.items[k], skip - node.offsets[k]))
+
+    def slice(self, start, end):
+        out = []
+        _rope_collect(self.root, max(start, 0), min(end, self.root.size), out)
+        return out
+
+    def insert(self, index, row):
+        index = max(0, min(index, self.root.size))
+        nodes = _rope_insert(self.root, index, row)
+        if len(nodes) > 1:
+            return Rope(_RopeNode(False, tuple(nodes)))
+        return Rope(nodes[0])
+
+    def delete(self, start, end):
+        start = max(start, 0)
+        end = min(end, self.root.size)
+        if start >= end:
+            return self
+        root = _rope_delete(self.root, start, end)
+        while not root.leaf and len(root.items) == 1:
+            root = root.items[0]
+        if not root.leaf and not root.items:
+            root = _RopeNode(True, ())
+        return Rope(root)
+
+    def replace(self, index, row):
+        if index < 0:
+            index += self.root.size
+        if not 0 <= index < self.root.size:
+            raise IndexError("rope index out of range")
+        return Rope(_rope_replace(self.root, index, row))
+
 class EditorState:
     def __init__(self):
         self.cursor_x = 0
@@ -99,19 +326,29 @@ class EditorState:
         self.screen_rows = 0
         self.screen_cols = 0
         self.total_rows = 0
-        self.rows = []
+        self.rows = Rope()
+        self.generation = 0   # Bumped whenever a snapshot of `rows` is kept
         self.modified = 0
         self.file_name = None
         self.status_message = ""
         self.status_message_time = 0
         self.current_syntax = None
+        # (hash(rendered line), prev_open_comment) -> (highlight, open_comment), LRU ordered.
+        # Highlight lists in here are shared between rows and must not be mutated.
+        self.hl_cache = OrderedDict()
+        self.hl_frontier = 0  # Rows above this index have up-to-date highlights
         
-        self.undo_stack = []  # List of (rows_copy, cursor_x, cursor_y)
+        self.undo_stack = []  # List of (rows, cursor_x, cursor_y, col_offset, row_offset)
         self.redo_stack = []
+        self.undo_insert_pos = None  # (row, col) where typing extends the last undo entry
         
         self.mark_x = None    # For selection start
         self.mark_y = None
         self.clipboard = ""   # Internal clipboard
+
+        self.row_dirty = bytearray()  # Screen rows that must be redrawn next frame
+        self.last_frame_rows = []     # What each screen row showed last frame
+        self.last_frame_view = None   # (row_offset, col_offset, screen_rows, screen_cols) of last frame
         
         self.update_screen_size()
 
@@ -124,66 +361,321 @@ class EditorState:
             # Handle cases where stdout is not a TTY
             self.screen_cols = 80
             self.screen_rows = 24
+        self.invalidate_screen()
+
+    def invalidate_screen(self):
+        """Force the next refresh_screen() to redraw every row."""
+        self.row_dirty = bytearray(b'\x01') * self.screen_rows
+        self.last_frame_rows = [None] * self.screen_rows
 
 
 E = EditorState()
 
+GAP_TYPECODE = 'w' if 'w' in typecodes else 'u'  # 'u' is deprecated from Python 3.13
+GAP_SIZE = 16
+GAP_THRESHOLD = 1024  # Rows shorter than this are edited as plain strings
+
+class GapBuffer:
+    """Characters of one row with a movable gap at the edit point.
+
+    ASCII rows keep their characters in a bytearray, one byte each; the
+    first non-ASCII insert switches the row to a wide array.
+    """
+    __slots__ = ('chars', 'gap_start', 'gap_end', 'is_ascii')
+
+    def __init__(self, text=''):
+        self.is_ascii = text.isascii()
+        self.chars = bytearray(text, 'ascii') if self.is_ascii else array(GAP_TYPECODE, text)
+        self.gap_start = self.gap_end = len(text)
+
+    def __len__(self):
+        return len(self.chars) - (self.gap_end - self.gap_start)
+
+    def decode(self, chars):
+        return chars.decode('ascii') if self.is_ascii else chars.tounicode()
+
+    def encode(self, text):
+        """`text` in the storage format of `chars`, widening it first if needed."""
+        if self.is_ascii:
+            if text.isascii():
+                return text.encode('ascii')
+            self.chars = array(GAP_TYPECODE, self.chars.decode('ascii'))
+            self.is_ascii = False
+        return array(GAP_TYPECODE, text)
+
+    def __getitem__(self, key):
+        """Text of a slice (step ignored), read around the gap."""
+        start, stop, _ = key.indices(len(self))
+        if stop <= start:
+            return ''
+        gap = self.gap_end - self.gap_start
+        if stop <= self.gap_start:
+            return self.decode(self.chars[start:stop])
+        if start >= self.gap_start:
+            return self.decode(self.chars[start + gap:stop + gap])
+        return self.decode(self.chars[start:self.gap_start]) + self.decode(self.chars[self.gap_end:stop + gap])
+
+    def to_str(self):
+        return self.decode(self.chars[:self.gap_start]) + self.decode(self.chars[self.gap_end:])
+
+    __str__ = to_str
+
+    def move_gap(self, position):
+        start, end = self.gap_start, self.gap_end
+        if position < start:
+            self.chars[end - (start - position):end] = self.chars[position:start]
+        elif position > start:
+            self.chars[start:position] = self.chars[end:end + (position - start)]
+        self.gap_end = end + (position - start)
+        self.gap_start = position
+
+    def insert(self, position, text):
+        data = self.encode(text)
+        self.move_gap(position)
+        if self.gap_end - self.gap_start < len(text):
+            grow = len(text) + max(GAP_SIZE, len(self) // 4)
+            self.chars[self.gap_start:self.gap_start] = self.encode(' ' * grow)
+            self.gap_end += grow
+        self.chars[self.gap_start:self.gap_start + len(text)] = data
+        self.gap_start += len(text)
+
+    def delete(self, position, count=1):
+        self.move_gap(position)
+        self.gap_end += count
+
+    def splice(self, start, end, text):
+        """Replace the characters in [start, end) with `text`."""
+        self.delete(start, end - start)
+        self.insert(start, text)
+
+    def write_to(self, out):
+        out.write(self.decode(self.chars[:self.gap_start]))
+        out.write(self.decode(self.chars[self.gap_end:]))
+
 class EditorRow:
-    def __init__(self, index, content):
-        self.index = index
-        self.content = content
+    __slots__ = ('_content', '_gap', 'content_size', '_dirty', '_rendered_content', '_rendered_size',
+                 'highlight', 'hl_prev', 'open_comment', 'generation', '_tab_cols', '_tab_stops')
+
+    def __init__(self, content):
+        self._content = content
+        self._gap = None  # GapBuffer once a long row is edited in place; _content is then a cache
         self.content_size = len(content)
-        self.rendered_content = None
-        self.rendered_size = 0
+        self._dirty = True  # rendered text and column maps are rebuilt on next use
+        self._rendered_content = None
+        self._rendered_size = 0
         self.highlight = None
-        self.open_comment = 0
-        self.update_rendered()
-
-    def has_open_comment(self):
-        if self.highlight and self.rendered_size and self.highlight[-1] == HL_MLCOMMENT:
-            if self.rendered_size < 2 or (self.rendered_content[-2] != '*' or self.rendered_content[-1] != '/'):
-                return True
-        return False
-
-    def update_syntax(self):
-        self.highlight = [HL_NORMAL] * self.rendered_size
+        self.hl_prev = None   # open_comment state of the previous row when last highlighted
+        self.open_comment = False
+        self.generation = E.generation
+        self._tab_cols = None   # Content col of each tab, None when the row has no tabs
+        self._tab_stops = None  # Rendered col each tab starts at
+
+    def copy(self):
+        row = EditorRow.__new__(EditorRow)
+        row._content = self.content
+        row._gap = None
+        row.content_size = self.content_size
+        row._dirty = self._dirty
+        row._rendered_content = self._rendered_content
+        row._rendered_size = self._rendered_size
+        row.highlight = self.highlight
+        row.hl_prev = self.hl_prev
+        row.open_comment = self.open_comment
+        row.generation = E.generation
+        row._tab_cols = self._tab_cols
+        row._tab_stops = self._tab_stops
+        return row
+
+    def update_syntax(self, prev_open_comment):
+        self.hl_prev = prev_open_comment
         if E.current_syntax is None:
+            self.highlight = all_normal_highlight(self.rendered_size)
+            self.open_comment = False
             return
 
-        prev_open_comment = self.index > 0 and E.rows[self.index - 1].has_open_comment()
+        key = (hash(self.rendered_content), prev_open_comment)
+        cached = E.hl_cache.get(key)
+        if cached is None:
+            highlight, open_comment = get_syntax_highlighting(self.rendered_content, E.current_syntax, prev_open_comment)
+            if not any(highlight):
+                highlight = all_normal_highlight(len(highlight))
+            cached = (highlight, open_comment)
+            E.hl_cache[key] = cached
+            if len(E.hl_cache) > HL_CACHE_SIZE:
+                E.hl_cache.popitem(last=False)
+        else:
+            E.hl_cache.move_to_end(key)
+        self.highlight, self.open_comment = cached
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = self._gap.to_str()
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._content = content
+        self._gap = None
+        self._dirty = True
+
+    def slice(self, start, end=None):
+        """content[start:end], without materializing a gap-buffered row."""
+        if self._content is None:
+            return self._gap[start:end]
+        return self._content[start:end]
+
+    def splice(self, start, end, text):
+        """Replace content[start:end] with `text`."""
+        if self._gap is None:
+            content = self._content
+            if len(content) - (end - start) + len(text) < GAP_THRESHOLD:
+                self._content = ''.join((content[:start], text, content[end:]))
+                self.content_size = len(self._content)
+                self._dirty = True
+                return
+            self._gap = GapBuffer(content) # Long row: edit in place from now on
+        self._gap.splice(start, end, text)
+        self._content = None
+        self.content_size = len(self._gap)
+        self._dirty = True
+
+    def write_to(self, out):
+        """Write the row text to `out` without materializing a gap-buffered row."""
+        if self._content is None:
+            self._gap.write_to(out)
+        else:
+            out.write(self._content)
 
-        self.highlight, new_open_comment = get_syntax_highlighting(
-            self.rendered_content, E.current_syntax, prev_open_comment
-        )
+    @property
+    def rendered_content(self):
+        if self._dirty:
+            self.update_rendered()
+        return self._rendered_content
 
-        # Check if the comment state change needs to propagate
-        if self.open_comment != new_open_comment and self.index + 1 < E.total_rows:
-            E.rows[self.index + 1].update_syntax()
-        self.open_comment = new_open_comment
+    @property
+    def rendered_size(self):
+        if self._dirty:
+            self.update_rendered()
+        return self._rendered_size
 
     def update_rendered(self):
-        self.rendered_content = self.content.replace('\t', '        ')
-        self.rendered_size = len(self.rendered_content)
-        self.update_syntax()
+        self._dirty = False
+        content = self.content
+        self.content_size = len(content)
+        self.update_tab_stops()
+        # Tabs advance to the next multiple of 8, matching the column maps
+        rendered_content = content.expandtabs(8) if '\t' in content else content
+        if rendered_content != self._rendered_content:
+            self._rendered_content = rendered_content
+            self._rendered_size = len(rendered_content)
+            self.hl_prev = None  # Highlight is stale until update_syntax_upto() reaches it
+
+    def update_tab_stops(self):
+        # Only the tabs are recorded: between two tabs rendered and content
+        # cols advance together, so the rest follows by arithmetic
+        content = self.content
+        i = content.find('\t')
+        if i < 0:
+            self._tab_cols = self._tab_stops = None
+            return
+        cols = array('i')
+        stops = array('i')
+        col = prev = 0
+        while i >= 0:
+            col += i - prev
+            cols.append(i)
+            stops.append(col)
+            col = (col // 8 + 1) * 8
+            prev = i + 1
+            i = content.find('\t', prev)
+        self._tab_cols = cols
+        self._tab_stops = stops
 
     def insert_char(self, position, ch):
         if position > self.content_size:
             position = self.content_size
-        self.content = self.content[:position] + ch + self.content[position:]
-        self.content_size += 1
-        self.update_rendered()
+        self.splice(position, position, ch)
 
     def append_string(self, string):
-        self.content += string
-        self.content_size += len(string)
-        self.update_rendered()
+        self.splice(self.content_size, self.content_size, string)
 
     def delete_char(self, position):
         if position >= self.content_size:
             return
-        self.content = self.content[:position] + self.content[position + 1:]
-        self.content_size -= 1
-        self.update_rendered()
+        self.splice(position, position + 1, '')
+
+def update_syntax_from(position):
+    """Mark the rows from `position` on for re-highlighting before they are next drawn."""
+    if position < E.hl_frontier:
+        E.hl_frontier = position
+
+def update_syntax_upto(end):
+    """Bring highlights up to date for every row above `end`.
+
+    Walks forward from E.hl_frontier, re-highlighting rows whose text changed
+    or whose multi-line comment state handed down from the previous row
+    differs from the one they were last highlighted with. Rows above the view
+    only get their comment state; their highlight is filled in when drawn.
+    """
+    position = E.hl_frontier
+    if position >= end:
+        return
+    prev_open_comment = E.rows[position - 1].open_comment if position > 0 else False
+    above = min(E.row_offset, end)
+    for row in E.rows.iter_from(position):
+        if position >= above:
+            break
+        if row._dirty or row.hl_prev != prev_open_comment:
+            # Scan the rest of the rows above the view in one go
+            rows = E.rows.slice(position, above)
+            states = get_open_comment_states([r.rendered_content for r in rows], E.current_syntax, prev_open_comment)
+            for r, open_comment in zip(rows, states):
+                r.hl_prev = prev_open_comment
+                r.highlight = None
+                r.open_comment = open_comment
+                prev_open_comment = open_comment
+            position = above
+            break
+        prev_open_comment = row.open_comment
+        position += 1
+    for row in E.rows.iter_from(position):
+        if position >= end:
+            break
+        if row._dirty:
+            row.update_rendered()
+        if row.hl_prev != prev_open_comment:
+            row.update_syntax(prev_open_comment)
+        prev_open_comment = row.open_comment
+        position += 1
+    E.hl_frontier = position
+
+ALL_NORMAL_HL = {}  # length -> shared read-only all-HL_NORMAL highlight
+
+def all_normal_highlight(length):
+    """Shared highlight for rows with nothing to color. Never mutate it."""
+    highlight = ALL_NORMAL_HL.get(length)
+    if highlight is None:
+        highlight = ALL_NORMAL_HL[length] = bytes(length)
+    return highlight
+
+def update_all_syntax():
+    """Mark every row for re-highlighting, e.g. after the current syntax changed."""
+    for row in E.rows:
+        row.hl_prev = None
+    update_syntax_from(0)
+
+def get_writable_row(position):
+    """Return the row at `position` ready for in-place edits.
+
+    Rows are shared with undo snapshots, so a row created before the last
+    snapshot is copied (and swapped into the rope) before it is modified.
+    """
+    row = E.rows[position]
+    if row.generation != E.generation:
+        row = row.copy()
+        E.rows = E.rows.replace(position, row)
+    return row
 
 original_termios = None
 
@@ -192,13 +684,14 @@ def disable_raw_mode():
         termios.tcsetattr(sys.stdin.fileno(), termios.TCSAFLUSH, original_termios)
 
 def enable_raw_mode():
-    global original_termios
+    global original_termios, termios
     
     # --- ADDED: Platform check for CLI mode ---
     if os.name != 'posix':
         print("NovaEdit CLI mode is only supported on Unix-like systems (Linux, macOS).")
         print("For Windows, please use the --gui flag.")
         sys.exit(1)
+    import termios
         
     try:
         fd = sys.stdin.fileno()
@@ -250,6 +743,21 @@ KEY_ACTION = {
     'PAGE_DOWN': 1008
 }
 
+# Escape sequences (after the ESC byte) for the special keys
+ESC_MAP = {
+    b'[A': KEY_ACTION['ARROW_UP'],
+    b'[B': KEY_ACTION['ARROW_DOWN'],
+    b'[C': KEY_ACTION['ARROW_RIGHT'],
+    b'[D': KEY_ACTION['ARROW_LEFT'],
+    b'[H': KEY_ACTION['HOME_KEY'],
+    b'[F': KEY_ACTION['END_KEY'],
+    b'OH': KEY_ACTION['HOME_KEY'],
+    b'OF': KEY_ACTION['END_KEY'],
+    b'[3~': KEY_ACTION['DEL_KEY'],
+    b'[5~': KEY_ACTION['PAGE_UP'],
+    b'[6~': KEY_ACTION['PAGE_DOWN'],
+}
+
 def read_key():
     try:
         ch = os.read(sys.stdin.fileno(), 1)
@@ -262,233 +770,222 @@ def read_key():
     ch = ord(ch)
     if ch == KEY_ACTION['ESC']:
         seq = os.read(sys.stdin.fileno(), 5)
-        if len(seq) < 2:
-            return KEY_ACTION['ESC']
-        seq1, seq2 = seq[0], seq[1]
-        if seq1 == ord('['):
-            if ord('0') <= seq2 <= ord('9'):
-                if len(seq) < 3:
-                    return KEY_ACTION['ESC']
-                seq3 = seq[2]
-                if seq3 == ord('~'):
-                    if seq2 == ord('3'):
-                        return KEY_ACTION['DEL_KEY']
-                    if seq2 == ord('5'):
-                        return KEY_ACTION['PAGE_UP']
-                    if seq2 == ord('6'):
-                        return KEY_ACTION['PAGE_DOWN']
-            else:
-                if seq2 == ord('A'):
-                    return KEY_ACTION['ARROW_UP']
-                if seq2 == ord('B'):
-                    return KEY_ACTION['ARROW_DOWN']
-                if seq2 == ord('C'):
-                    return KEY_ACTION['ARROW_RIGHT']
-                if seq2 == ord('D'):
-                    return KEY_ACTION['ARROW_LEFT']
-                if seq2 == ord('H'):
-                    return KEY_ACTION['HOME_KEY']
-                if seq2 == ord('F'):
-                    return KEY_ACTION['END_KEY']
-        elif seq1 == ord('O'):
-            if seq2 == ord('H'):
-                return KEY_ACTION['HOME_KEY']
-            if seq2 == ord('F'):
-                return KEY_ACTION['END_KEY']
+        return ESC_MAP.get(seq[:3]) or ESC_MAP.get(seq[:2], KEY_ACTION['ESC'])
     return ch
 
+# Separator flags for the first 256 code points; anything above falls back to isspace()
+SEP_TABLE = bytes(c == 0 or chr(c).isspace() or chr(c) in SEPARATORS for c in range(256))
+
 def is_separator(ch):
-    return ch == '\0' or ch.isspace() or ch in ",.()+-/*=~%[];"
+    c = ord(ch)
+    return SEP_TABLE[c] if c < 256 else ch.isspace()
+
+# Colors indexed by highlight class, HL_NORMAL .. HL_MATCH
+COLOR_TABLE = (37, 37, 36, 36, 33, 32, 35, 31, 34)
+COLOR_ESCAPES = tuple(f"\x1b[{color}m".encode() for color in COLOR_TABLE)
+TK_COLOR_TABLE = ("black", "black", "gray", "gray", "blue", "green", "red", "purple", "orange")
+TK_TAG_NAMES = tuple(f"hl_{hl}" for hl in range(len(TK_COLOR_TABLE)))  # Text widget tag per HL class
 
 def syntax_to_color(hl):
-    color_map = {
-        HL_COMMENT: 36, HL_MLCOMMENT: 36,
-        HL_KEYWORD1: 33,
-        HL_KEYWORD2: 32,
-        HL_STRING: 35,
-        HL_NUMBER: 31,
-        HL_MATCH: 34
-    }
-    return color_map.get(hl, 37)
+    return COLOR_TABLE[hl]
 
 def syntax_to_tk_color(hl):
-    color_map = {
-        HL_COMMENT: "gray", HL_MLCOMMENT: "gray",
-        HL_KEYWORD1: "blue",
-        HL_KEYWORD2: "green",
-        HL_STRING: "red",
-        HL_NUMBER: "purple",
-        HL_MATCH: "orange"
-    }
-    return color_map.get(hl, "black")
+    return TK_COLOR_TABLE[hl]
 
 def select_syntax_highlight(file_name):
-    if file_name is None:
-        E.current_syntax = None
-        return None
-    for syntax in SYNTAX_DB:
-        for ext in syntax.file_extensions:
-            if file_name.endswith(ext):
-                E.current_syntax = syntax
-                return syntax
-    E.current_syntax = None
-    return None
+    syntax = None
+    if file_name is not None:
+        for candidate in SYNTAX_DB:
+            if any(file_name.endswith(ext) for ext in candidate.file_extensions):
+                syntax = candidate
+                break
+    if syntax is not E.current_syntax:
+        E.hl_cache.clear()  # Cached highlights belong to the old syntax
+    E.current_syntax = syntax
+    return syntax
 
 # --- NEW: Shared Syntax Highlighting Function ---
 def get_syntax_highlighting(line, syntax, prev_open_comment):
     """
     Shared syntax highlighting logic for both CLI and GUI modes.
     Takes a line of text, syntax rules, and previous comment state.
-    Returns a list of highlight constants and the new open_comment state (bool).
+    Returns a bytearray of highlight constants and the new open_comment state (bool).
+    """
+    if syntax is None:
+        return bytearray(len(line)), False # Return False for open_comment
+    return highlight_text(line, syntax, prev_open_comment)
+
+def get_syntax_highlighting_lines(lines, syntax, prev_open_comment):
+    """
+    Highlight a run of consecutive lines with a single tokenizer pass over
+    the joined text. Returns one (highlight, open_comment) pair per line,
+    the same as chaining get_syntax_highlighting over them.
     """
-    highlight = [HL_NORMAL] * len(line)
     if syntax is None:
-        return highlight, False # Return False for open_comment
+        return [(bytearray(len(line)), False) for line in lines]
+
+    text = '\n'.join(lines)
+    highlight, in_comment = highlight_text(text, syntax, prev_open_comment)
+    results = []
+    start = 0
+    for line in lines:
+        end = start + len(line)
+        # A line leaves a comment open iff its newline lies inside that comment
+        open_comment = highlight[end] == HL_MLCOMMENT if end < len(text) else in_comment
+        results.append((highlight[start:end], open_comment))
+        start = end + 1
+    return results
+
+def get_open_comment_states(lines, syntax, prev_open_comment):
+    """
+    The open_comment state after each of `lines`, as get_syntax_highlighting_lines
+    would report it, without building the highlights.
+    """
+    if syntax is None:
+        return [False] * len(lines)
+
+    text = '\n'.join(lines)
+    mce = syntax.multiline_comment_end
+    comments = []  # [start, end) of every multi-line comment, in order
+    i = comment_start = 0
+    in_comment = prev_open_comment
+    while True:
+        if in_comment:
+            end = text.find(mce, i) if mce else -1
+            if end < 0:
+                comments.append((comment_start, len(text) + 1))
+                break
+            i = end + len(mce)
+            comments.append((comment_start, i))
+            in_comment = False
+
+        for m in syntax.comment_re.finditer(text, i):
+            if m.lastgroup == 'mlc':
+                comment_start, i = m.span()
+                in_comment = True
+                break
+        else:
+            break
 
-    keywords = syntax.keywords
-    scs = syntax.singleline_comment_start
-    mcs = syntax.multiline_comment_start
+    # A line leaves a comment open iff its newline lies inside that comment
+    states = []
+    k = 0
+    end = -1
+    for line in lines:
+        end += len(line) + 1
+        while k < len(comments) and comments[k][1] <= end:
+            k += 1
+        states.append(k < len(comments) and comments[k][0] <= end)
+    return states
+
+def highlight_text(line, syntax, prev_open_comment):
+    """Tokenize `line` (which may span several lines) with `syntax`."""
+    highlight = bytearray(len(line)) # Zero-filled, i.e. all HL_NORMAL
     mce = syntax.multiline_comment_end
+    keyword_hl = syntax.keyword_hl
+    length = len(line)
 
     i = 0
-    prev_sep = True
-    in_string = ''
     in_comment = prev_open_comment
 
-    while i < len(line):
-        ch = line[i]
-        
-        # Handle Single-line comments
-        if scs and not in_string and not in_comment and line.startswith(scs, i):
-            for j in range(i, len(line)):
-                highlight[j] = HL_COMMENT
-            return highlight, False # Single line comment can't carry over
-
-        # Handle Multi-line comments
+    while True:
+        # Handle Multi-line comments: jump straight to the closing delimiter
         if in_comment:
-            highlight[i] = HL_MLCOMMENT
-            if mce and line.startswith(mce, i) and (len(mce) > 0):
-                for j in range(len(mce)):
-                    if i + j < len(line):
-                         highlight[i + j] = HL_MLCOMMENT
-                i += len(mce)
-                in_comment = False
-                prev_sep = True
-                continue
-            prev_sep = False
-            i += 1
-            continue
-        elif mcs and line.startswith(mcs, i) and (len(mcs) > 0):
-            for j in range(len(mcs)):
-                 if i + j < len(line):
-                    highlight[i + j] = HL_MLCOMMENT
-            i += len(mcs)
-            in_comment = True
-            prev_sep = False
-            continue
-
-        # Handle Strings
-        if in_string:
-            highlight[i] = HL_STRING
-            if ch == '\\':
-                if i + 1 < len(line):
-                    highlight[i + 1] = HL_STRING
-                    i += 2
-                    prev_sep = False
+            end = line.find(mce, i) if mce else -1
+            if end < 0:
+                highlight[i:] = bytes((HL_MLCOMMENT,)) * (length - i)
+                return highlight, True
+            end += len(mce)
+            highlight[i:end] = bytes((HL_MLCOMMENT,)) * (end - i)
+            i = end
+            in_comment = False
+
+        for m in syntax.token_re.finditer(line, i):
+            kind = m.lastgroup
+            start, end = m.span()
+            if kind == 'id':
+                # Keywords must sit between separators (and not follow a number)
+                hl = keyword_hl.get(m.group())
+                if hl is None:
                     continue
-            if ch == in_string:
-                in_string = ''
-            i += 1
-            continue
+                if start > 0 and (highlight[start - 1] == HL_NUMBER or not is_separator(line[start - 1])):
+                    continue
+                if end < length and not is_separator(line[end]):
+                    continue
+            elif kind == 'mlc':
+                highlight[start:end] = bytes((HL_MLCOMMENT,)) * (end - start)
+                i = end
+                in_comment = True
+                break
+            elif kind == 'str':
+                hl = HL_STRING
+            elif kind == 'num':
+                hl = HL_NUMBER
+            else: # Single-line comment can't carry over
+                hl = HL_COMMENT
+            highlight[start:end] = bytes((hl,)) * (end - start)
         else:
-            if ch in ('"', "'"):
-                in_string = ch
-                highlight[i] = HL_STRING
-                i += 1
-                prev_sep = False
-                continue
-
-        # Handle Numbers
-        if (ch.isdigit() and (prev_sep or (i > 0 and highlight[i - 1] == HL_NUMBER))) or \
-           (ch == '.' and i > 0 and highlight[i - 1] == HL_NUMBER):
-            highlight[i] = HL_NUMBER
-            i += 1
-            prev_sep = False
-            continue
-
-        # Handle Keywords
-        if prev_sep:
-            found_kw = False
-            for kw in keywords:
-                kw2 = kw.endswith('|')
-                klen = len(kw) - 1 if kw2 else len(kw)
-                if line[i:i + klen] == kw[:klen] and (i + klen >= len(line) or is_separator(line[i + klen])):
-                    hl_type = HL_KEYWORD2 if kw2 else HL_KEYWORD1
-                    for j in range(klen):
-                        highlight[i + j] = hl_type
-                    i += klen
-                    found_kw = True
-                    break
-            if found_kw:
-                prev_sep = False
-                continue
-
-        prev_sep = is_separator(ch)
-        i += 1
-
-    return highlight, in_comment
+            return highlight, False
 # --- END: Shared Function ---
 
 
 def get_content_col(row, rendered_col):
-    content_col = 0
-    rendered = 0
-    while content_col < row.content_size and rendered < rendered_col:
-        if row.content[content_col] == '\t':
-            tab_len = 8 - (rendered % 8)
-            if rendered + tab_len > rendered_col:
-                break
-            rendered += tab_len
-        else:
-            rendered += 1
-        content_col += 1
-    return content_col
+    if row._dirty:
+        row.update_rendered()
+    if rendered_col <= 0:
+        return 0
+    if row._tab_stops is None:
+        return min(rendered_col, row.content_size)
+    k = bisect.bisect_right(row._tab_stops, rendered_col) - 1  # Last tab starting at or before it
+    if k < 0:
+        return rendered_col
+    tab_end = (row._tab_stops[k] // 8 + 1) * 8
+    if rendered_col < tab_end:
+        return row._tab_cols[k]
+    return min(row._tab_cols[k] + 1 + rendered_col - tab_end, row.content_size)
 
 def get_rendered_col(row, content_col):
-    rendered = 0
-    for i in range(min(content_col, len(row.content))):
-        if row.content[i] == '\t':
-            rendered += 8 - (rendered % 8)
-        else:
-            rendered += 1
-    return rendered
+    if row._dirty:
+        row.update_rendered()
+    if content_col <= 0:
+        return 0
+    content_col = min(content_col, row.content_size)
+    if row._tab_stops is None:
+        return content_col
+    k = bisect.bisect_left(row._tab_cols, content_col) - 1  # Last tab before it
+    if k < 0:
+        return content_col
+    return (row._tab_stops[k] // 8 + 1) * 8 + content_col - row._tab_cols[k] - 1
 
 def insert_editor_row(position, content):
     if position > E.total_rows:
         position = E.total_rows
-    new_row = EditorRow(position, content)
-    E.rows.insert(position, new_row)
-    for i in range(position + 1, E.total_rows + 1):
-        E.rows[i].index += 1
+    E.rows = E.rows.insert(position, EditorRow(content))
     E.total_rows += 1
     E.modified = 1
+    update_syntax_from(position)
 
-def delete_editor_row(position):
-    if position >= E.total_rows:
+def delete_editor_row(position, count=1):
+    end = min(position + count, E.total_rows)
+    if position >= end:
         return
-    del E.rows[position]
-    for i in range(position, E.total_rows - 1):
-        E.rows[i].index -= 1
-    E.total_rows -= 1
+    E.rows = E.rows.delete(position, end)
+    E.total_rows -= end - position
     E.modified = 1
+    update_syntax_from(position)
 
 def rows_to_string():
-    return '\n'.join(row.content for row in E.rows) + '\n'
+    out = io.StringIO()
+    for row in E.rows:
+        row.write_to(out)
+        out.write('\n')
+    return out.getvalue()
 
 def save_undo_state():
-    rows_copy = [row.content for row in E.rows]
-    E.undo_stack.append((rows_copy, E.cursor_x, E.cursor_y, E.col_offset, E.row_offset))
+    E.undo_stack.append((E.rows, E.cursor_x, E.cursor_y, E.col_offset, E.row_offset))
+    E.generation += 1  # Rows now shared with the snapshot must be copied before editing
     E.redo_stack = []  # Clear redo on new action
+    E.undo_insert_pos = None
     if len(E.undo_stack) > 50:
         E.undo_stack.pop(0)
 
@@ -496,17 +993,13 @@ def undo():
     if not E.undo_stack:
         set_status_message("Nothing to undo")
         return
-    current_state = ([row.content for row in E.rows], E.cursor_x, E.cursor_y, E.col_offset, E.row_offset)
+    E.undo_insert_pos = None
+    current_state = (E.rows, E.cursor_x, E.cursor_y, E.col_offset, E.row_offset)
     E.redo_stack.append(current_state)
-    rows_copy, cursor_x, cursor_y, col_offset, row_offset = E.undo_stack.pop()
-    E.rows = []
-    E.total_rows = 0
-    for content in rows_copy:
-        insert_editor_row(E.total_rows, content)
-    E.cursor_x = cursor_x
-    E.cursor_y = cursor_y
-    E.col_offset = col_offset
-    E.row_offset = row_offset
+    E.generation += 1
+    E.rows, E.cursor_x, E.cursor_y, E.col_offset, E.row_offset = E.undo_stack.pop()
+    E.total_rows = len(E.rows)
+    update_syntax_from(0)
     E.modified = 1
     set_status_message("Undo performed")
 
@@ -514,32 +1007,34 @@ def redo():
     if not E.redo_stack:
         set_status_message("Nothing to redo")
         return
-    current_state = ([row.content for row in E.rows], E.cursor_x, E.cursor_y, E.col_offset, E.row_offset)
+    E.undo_insert_pos = None
+    current_state = (E.rows, E.cursor_x, E.cursor_y, E.col_offset, E.row_offset)
     E.undo_stack.append(current_state)
-    rows_copy, cursor_x, cursor_y, col_offset, row_offset = E.redo_stack.pop()
-    E.rows = []
-    E.total_rows = 0
-    for content in rows_copy:
-        insert_editor_row(E.total_rows, content)
-    E.cursor_x = cursor_x
-    E.cursor_y = cursor_y
-    E.col_offset = col_offset
-    E.row_offset = row_offset
+    E.generation += 1
+    E.rows, E.cursor_x, E.cursor_y, E.col_offset, E.row_offset = E.redo_stack.pop()
+    E.total_rows = len(E.rows)
+    update_syntax_from(0)
     E.modified = 1
     set_status_message("Redo performed")
 
 def insert_char(ch):
-    save_undo_state()
     ch = chr(ch) if isinstance(ch, int) else ch
-    file_row = E.row_offset + E.cursor_y
+    file_row = max(E.row_offset + E.cursor_y, 0)
     if file_row > E.total_rows:
          file_row = E.total_rows
+    file_col = 0
+    if file_row < E.total_rows:
+        file_col = get_content_col(E.rows[file_row], E.col_offset + E.cursor_x)
+    # A run of typed characters shares one undo entry
+    if E.undo_insert_pos != (file_row, file_col):
+        save_undo_state()
     while E.total_rows <= file_row:
         insert_editor_row(E.total_rows, '')
-    row = E.rows[file_row]
-    file_col = get_content_col(row, E.col_offset + E.cursor_x)
+    row = get_writable_row(file_row)
 
     row.insert_char(file_col, ch)
+    E.undo_insert_pos = (file_row, file_col + 1)
+    update_syntax_from(file_row)
     E.cursor_x += 1
     if E.cursor_x == E.screen_cols:
         E.cursor_x -= 1
@@ -550,20 +1045,20 @@ def insert_char(ch):
 
 def insert_newline():
     save_undo_state()
-    file_row = E.row_offset + E.cursor_y
+    file_row = max(E.row_offset + E.cursor_y, 0)
     if E.total_rows <= file_row:
         insert_editor_row(file_row, '')
     else:
-        row = E.rows[file_row]
+        row = get_writable_row(file_row)
         file_col = get_content_col(row, E.col_offset + E.cursor_x)
         if file_col > row.content_size:
             file_col = row.content_size
         if file_col == 0:
             insert_editor_row(file_row, '')
         else:
-            insert_editor_row(file_row + 1, row.content[file_col:])
-            row.content = row.content[:file_col]
-            row.update_rendered()
+            insert_editor_row(file_row + 1, row.slice(file_col))
+            row.splice(file_col, row.content_size, '')
+            update_syntax_from(file_row)
             
     E.cursor_x = 0
     E.col_offset = 0
@@ -576,7 +1071,7 @@ def insert_newline():
 
 def delete_char():
     save_undo_state()
-    file_row = E.row_offset + E.cursor_y
+    file_row = max(E.row_offset + E.cursor_y, 0)
     if file_row >= E.total_rows:
         return
     row = E.rows[file_row]
@@ -584,10 +1079,11 @@ def delete_char():
     if rendered_pos == 0:
         if file_row == 0:
             return
-        prev_row = E.rows[file_row - 1]
+        prev_row = get_writable_row(file_row - 1)
         prev_row_len_before = prev_row.content_size
-        prev_row.append_string(row.content)
+        prev_row.append_string(row.slice(0))
         delete_editor_row(file_row)
+        update_syntax_from(file_row - 1)
         if E.cursor_y == 0:
             if E.row_offset > 0: E.row_offset -= 1
         else:
@@ -604,7 +1100,9 @@ def delete_char():
              
     else:
         position = get_content_col(row, rendered_pos - 1)
+        row = get_writable_row(file_row)
         row.delete_char(position)
+        update_syntax_from(file_row)
         if E.cursor_x > 0:
             E.cursor_x -= 1
         elif E.col_offset > 0:
@@ -652,16 +1150,20 @@ def open_file_terminal(file_name=None):
     E.file_name = file_name # Set file_name first
     E.current_syntax = select_syntax_highlight(file_name) # <-- FIX: Set syntax *before* loading rows
     
-    E.rows = []
+    E.rows = Rope()
+    E.hl_frontier = 0
     E.total_rows = 0
     E.modified = 0
     E.cursor_x = E.cursor_y = E.row_offset = E.col_offset = 0
 
     try:
         with open(file_name, 'r') as f:
-            for line in f:
-                line = line.rstrip('\r\n')
-                insert_editor_row(E.total_rows, line)
+            lines = f.read().split('\n')
+        if lines[-1] == '':
+            lines.pop() # Trailing newline (or empty file)
+        # Build all rows at once; they are rendered and highlighted as they come on screen
+        E.rows = Rope.from_rows([EditorRow(line) for line in lines])
+        E.total_rows = len(lines)
     except FileNotFoundError:
         set_status_message(f"File {file_name} not found. Created new file.")
     except Exception as e:
@@ -681,7 +1183,10 @@ def save_file_terminal(save_as=False):
             set_status_message("Save canceled")
             return
         E.file_name = new_name
+        old_syntax = E.current_syntax
         E.current_syntax = select_syntax_highlight(E.file_name) # Update syntax
+        if E.current_syntax is not old_syntax:
+            update_all_syntax()
     
     if not E.file_name: # Still no file name (e.g., canceled Save As on new file)
         set_status_message("Save canceled")
@@ -693,9 +1198,6 @@ def save_file_terminal(save_as=False):
             f.write(content)
         E.modified = 0
         set_status_message(f"{len(content)} bytes saved to {E.file_name}")
-        # Re-highlight after save (in case file type changed)
-        for row in E.rows:
-            row.update_syntax()
     except Exception as e:
         set_status_message(f"Error saving file: {str(e)}")
 
@@ -703,36 +1205,83 @@ def set_status_message(message):
     E.status_message = message
     E.status_message_time = time.time()
 
+HL_RUN_RE = re.compile(rb'(.)\1*', re.DOTALL)  # Maximal runs of one highlight class
+HL_TAG_RUN_RE = re.compile(rb'([^\x00])\1*')  # Same, skipping HL_NORMAL runs
+
 class AppendBuffer:
+    """Collects one frame of terminal output as UTF-8 bytes."""
     def __init__(self):
-        self.buffer = []
+        self.buffer = bytearray()
 
-    def append(self, string):
-        self.buffer.append(string)
+    def append(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.buffer += data
 
     def get(self):
-        return ''.join(self.buffer)
+        return bytes(self.buffer)
+
+# Last-frame markers for screen rows past the end of the file
+TILDE_ROW = ('~', None)
+WELCOME_ROW = ('welcome', None)
 
 def refresh_screen():
     ab = AppendBuffer()
-    ab.append("\x1b[?25l")  # Hide cursor
-    ab.append("\x1b[H")  # Home
+    ab.append(b"\x1b[?25l")  # Hide cursor
+    ab.append(b"\x1b[H")  # Home
+
+    update_syntax_upto(E.row_offset + E.screen_rows)
 
+    frame_view = (E.row_offset, E.col_offset, E.screen_rows, E.screen_cols)
+    if frame_view != E.last_frame_view or len(E.row_dirty) != E.screen_rows:
+        E.invalidate_screen()
+        E.last_frame_view = frame_view
+
+    # Rows whose text and highlight objects are the ones drawn last frame are
+    # skipped; both are replaced (never mutated) whenever a row changes.
+    skipped = False
     for y in range(E.screen_rows):
         file_row = E.row_offset + y
+        if file_row >= E.total_rows and E.total_rows:
+            # Everything below the buffer is '~': emit the tail in one piece if any of it changed
+            tail = E.screen_rows - y
+            if any(E.row_dirty[y:]) or any(last is not TILDE_ROW for last in E.last_frame_rows[y:]):
+                if skipped:
+                    ab.append(f"\x1b[{y + 1};1H")
+                    skipped = False
+                ab.append(b"~\x1b[0K\r\n" * tail)
+                E.last_frame_rows[y:] = [TILDE_ROW] * tail
+            else:
+                skipped = True
+            break
+        if file_row >= E.total_rows:
+            shown = WELCOME_ROW if E.total_rows == 0 and y == E.screen_rows // 3 else TILDE_ROW
+        else:
+            row = E.rows[file_row]
+            if row.highlight is None:
+                row.update_syntax(row.hl_prev) # Only its comment state is known, see update_syntax_upto()
+            shown = (row.rendered_content, row.highlight)
+        last = E.last_frame_rows[y]
+        if not E.row_dirty[y] and last is not None and last[0] is shown[0] and last[1] is shown[1]:
+            skipped = True
+            continue
+        E.last_frame_rows[y] = shown
+        if skipped:
+            ab.append(f"\x1b[{y + 1};1H")
+            skipped = False
+
         if file_row >= E.total_rows:
-            if E.total_rows == 0 and y == E.screen_rows // 3:
+            if shown is WELCOME_ROW:
                 welcome = f"NovaEdit -- version {NOVA_VERSION}\x1b[0K\r\n"
                 padding = (E.screen_cols - len(welcome)) // 2
                 if padding > 0:
-                    ab.append('~')
+                    ab.append(b'~')
                     ab.append(' ' * (padding - 1))
                 ab.append(welcome)
             else:
-                ab.append("~\x1b[0K\r\n")
+                ab.append(b"~\x1b[0K\r\n")
             continue
 
-        row = E.rows[file_row]
         length = row.rendered_size - E.col_offset
         if length < 0: length = 0
         if length > E.screen_cols:
@@ -742,31 +1291,39 @@ def refresh_screen():
         hl = row.highlight[E.col_offset:E.col_offset + length]
         current_color = -1
         
-        for i in range(length):
-            if hl[i] == HL_NONPRINT:
-                ab.append("\x1b[7m")
-                sym = '@' + chr(ord(content[i])) if ord(content[i]) <= 26 else '?'
-                ab.append(sym)
-                ab.append("\x1b[0m")
-            elif hl[i] == HL_NORMAL:
+        # Emit each run of same-class characters as one slice
+        for run in HL_RUN_RE.finditer(hl):
+            start, end = run.span()
+            hl_type = hl[start]
+            if hl_type == HL_NONPRINT:
+                for ch in content[start:end]:
+                    ab.append(b"\x1b[7m")
+                    sym = '@' + chr(ord(ch)) if ord(ch) <= 26 else '?'
+                    ab.append(sym)
+                    ab.append(b"\x1b[0m")
+            elif hl_type == HL_NORMAL:
                 if current_color != -1:
-                    ab.append("\x1b[39m")
+                    ab.append(b"\x1b[39m")
                     current_color = -1
-                ab.append(content[i])
+                ab.append(content[start:end])
             else:
-                color = syntax_to_color(hl[i])
+                color = COLOR_TABLE[hl_type]
                 if color != current_color:
-                    ab.append(f"\x1b[{color}m")
+                    ab.append(COLOR_ESCAPES[hl_type])
                     current_color = color
-                ab.append(content[i])
+                ab.append(content[start:end])
                 
-        ab.append("\x1b[39m")
-        ab.append("\x1b[0K")
-        ab.append("\r\n")
+        ab.append(b"\x1b[39m")
+        ab.append(b"\x1b[0K")
+        ab.append(b"\r\n")
+
+    E.row_dirty[:] = bytes(E.screen_rows)
+    if skipped:
+        ab.append(f"\x1b[{E.screen_rows + 1};1H")
 
     # Status bar
-    ab.append("\x1b[0K")
-    ab.append("\x1b[7m")
+    ab.append(b"\x1b[0K")
+    ab.append(b"\x1b[7m")
     
     file_name_str = E.file_name or "[No Name]"
     status = f"{file_name_str[:20]} - {E.total_rows} lines {'(modified)' if E.modified else ''}"
@@ -782,13 +1339,13 @@ def refresh_screen():
             ab.append(rstatus)
             status_length += len(rstatus)
             break
-        ab.append(" ")
+        ab.append(b" ")
         status_length += 1
         
-    ab.append("\x1b[0m\r\n")
+    ab.append(b"\x1b[0m\r\n")
 
     # Status message
-    ab.append("\x1b[0K")
+    ab.append(b"\x1b[0K")
     msg_len = len(E.status_message)
     if msg_len and time.time() - E.status_message_time < 5:
         ab.append(E.status_message[:min(msg_len, E.screen_cols)])
@@ -803,12 +1360,15 @@ def refresh_screen():
         if cx < 1: cx = 1
         
     ab.append(f"\x1b[{E.cursor_y + 1};{cx}H")
-    ab.append("\x1b[?25h")  # Show cursor
+    ab.append(b"\x1b[?25h")  # Show cursor
 
-    sys.stdout.write(ab.get())
-    sys.stdout.flush()
+    # One write() per frame, straight to the terminal without the stdio layer
+    data = memoryview(ab.get())
+    while data:
+        data = data[os.write(sys.stdout.fileno(), data):]
 
 def move_cursor(key):
+    E.undo_insert_pos = None
     file_row = E.row_offset + E.cursor_y
     row = E.rows[file_row] if file_row < E.total_rows else None
     
@@ -861,6 +1421,36 @@ def move_cursor(key):
             E.col_offset = row_len
             E.cursor_x = 0
             
+def move_page(key):
+    """PAGE_UP / PAGE_DOWN: the same as a screenful of arrow presses, in one step."""
+    E.undo_insert_pos = None
+    file_row = E.row_offset + E.cursor_y
+    if key == KEY_ACTION['PAGE_UP']:
+        target = max(file_row - E.screen_rows, 0)
+        passed = E.rows.slice(target, file_row)
+    else:
+        target = max(min(file_row + E.screen_rows, E.total_rows - 1), file_row)
+        passed = E.rows.slice(file_row + 1, target + 1)
+    if not passed and file_row < E.total_rows:
+        passed = [E.rows[file_row]]
+    # Each arrow press snaps the column to its row's end, so the shortest row passed wins
+    row_len = min((row.rendered_size for row in passed), default=0)
+    reposition_viewport(target, min(E.col_offset + E.cursor_x, row_len))
+
+def reposition_viewport(file_row, render_col):
+    """Move the cursor to `file_row`, `render_col`, scrolling just enough to keep it on screen."""
+    if file_row < E.row_offset:
+        E.row_offset = file_row
+    if file_row >= E.row_offset + E.screen_rows:
+        E.row_offset = file_row - E.screen_rows + 1
+    E.cursor_y = file_row - E.row_offset
+
+    if render_col < E.col_offset:
+        E.col_offset = render_col
+    if render_col >= E.col_offset + E.screen_cols:
+        E.col_offset = render_col - E.screen_cols + 1
+    E.cursor_x = render_col - E.col_offset
+
 def set_mark():
     E.mark_x = E.col_offset + E.cursor_x
     E.mark_y = E.row_offset + E.cursor_y
@@ -880,11 +1470,15 @@ def copy_selection():
         line_end = end_x if y == end_y else row.rendered_size
         content_start = get_content_col(row, line_start)
         content_end = get_content_col(row, line_end)
-        clipboard_lines.append(row.content[content_start:content_end])
+        clipboard_lines.append(row.slice(content_start, content_end))
     E.clipboard = '\n'.join(clipboard_lines)
     set_status_message("Copied to clipboard")
 
 def cut_selection():
+    if E.mark_y is None or E.mark_x is None:
+        # Don't cut with a stale clipboard from an earlier copy
+        set_status_message("No selection")
+        return
     copy_selection()
     if E.clipboard:
         save_undo_state()
@@ -896,33 +1490,20 @@ def cut_selection():
         new_cursor_x_render = start_x_render
 
         # Delete logic (from end to start)
-        first_row = E.rows[start_y]
+        first_row = get_writable_row(start_y)
         last_row = E.rows[end_y]
         
         start_x_content = get_content_col(first_row, start_x_render)
         end_x_content = get_content_col(last_row, end_x_render)
         
         # Merge start and end row parts
-        first_row.content = first_row.content[:start_x_content] + last_row.content[end_x_content:]
-        first_row.update_rendered()
+        first_row.splice(start_x_content, first_row.content_size, last_row.slice(end_x_content))
         
-        # Delete intermediate rows
-        for y in range(end_y, start_y, -1):
-            if y < E.total_rows:
-                delete_editor_row(y)
+        # Delete intermediate rows, all in one go
+        delete_editor_row(start_y + 1, end_y - start_y)
+        update_syntax_from(start_y)
                 
-        # Set new cursor position
-        if new_cursor_y_file < E.row_offset:
-            E.row_offset = new_cursor_y_file
-        if new_cursor_y_file >= E.row_offset + E.screen_rows:
-            E.row_offset = new_cursor_y_file - E.screen_rows + 1
-        E.cursor_y = new_cursor_y_file - E.row_offset
-
-        if new_cursor_x_render < E.col_offset:
-            E.col_offset = new_cursor_x_render
-        if new_cursor_x_render >= E.col_offset + E.screen_cols:
-            E.col_offset = new_cursor_x_render - E.screen_cols + 1
-        E.cursor_x = new_cursor_x_render - E.col_offset
+        reposition_viewport(new_cursor_y_file, new_cursor_x_render)
         
         E.mark_x = None
         E.mark_y = None
@@ -935,64 +1516,68 @@ def paste_clipboard():
         return
     save_undo_state()
     lines = E.clipboard.split('\n')
-    file_row = E.row_offset + E.cursor_y
+    file_row = max(E.row_offset + E.cursor_y, 0)
     if file_row >= E.total_rows:
         insert_editor_row(E.total_rows, "")
     
-    row = E.rows[file_row]
+    row = get_writable_row(file_row)
     file_col = get_content_col(row, E.col_offset + E.cursor_x)
 
-    # Insert first line
-    remaining_content = row.content[file_col:]
-    row.content = row.content[:file_col] + lines[0]
+    suffix = row.slice(file_col)
     
     # Calculate cursor pos for after paste
     new_cursor_y_file = file_row + len(lines) - 1
     new_cursor_x_content = len(lines[-1])
     if len(lines) == 1:
         new_cursor_x_content += file_col
-    
-    # Insert remaining lines
-    for i, line in enumerate(lines[1:], 1):
+
+    if len(lines) == 1:
+        row.splice(file_col, file_col, lines[0])
+    else:
+        # The text after the cursor ends up on the last pasted line
+        row.splice(file_col, row.content_size, lines[0])
+        for line in lines[1:-1]:
+            file_row += 1
+            insert_editor_row(file_row, line)
         file_row += 1
-        insert_editor_row(file_row, line)
-    
-    # Add the remaining content to the last pasted line
-    E.rows[file_row].content += remaining_content
-    E.rows[file_row].update_rendered()
+        insert_editor_row(file_row, ''.join((lines[-1], suffix)))
     
-    # Update all rows syntax in between
-    for i in range(E.row_offset + E.cursor_y, file_row + 1):
-        if i < E.total_rows:
-            E.rows[i].update_rendered()
+    # Touched rows render lazily when next drawn; only their highlights need invalidating
+    update_syntax_from(E.row_offset + E.cursor_y)
 
     # Set new cursor position
     new_row = E.rows[new_cursor_y_file]
-    new_cursor_x_render = get_rendered_col(new_row, new_cursor_x_content)
-    
-    if new_cursor_y_file < E.row_offset:
-        E.row_offset = new_cursor_y_file
-    if new_cursor_y_file >= E.row_offset + E.screen_rows:
-        E.row_offset = new_cursor_y_file - E.screen_rows + 1
-    E.cursor_y = new_cursor_y_file - E.row_offset
-
-    if new_cursor_x_render < E.col_offset:
-        E.col_offset = new_cursor_x_render
-    if new_cursor_x_render >= E.col_offset + E.screen_cols:
-        E.col_offset = new_cursor_x_render - E.screen_cols + 1
-    E.cursor_x = new_cursor_x_render - E.col_offset
+    reposition_viewport(new_cursor_y_file, get_rendered_col(new_row, new_cursor_x_content))
 
     E.modified = 1
     set_status_message("Pasted from clipboard")
 
+# Keys whose action doesn't depend on the key itself
+KEY_HANDLERS = {
+    KEY_ACTION['ENTER']: insert_newline,
+    KEY_ACTION['CTRL_S']: save_file_terminal,
+    KEY_ACTION['CTRL_A']: lambda: save_file_terminal(save_as=True),
+    KEY_ACTION['CTRL_O']: open_file_terminal,
+    KEY_ACTION['CTRL_Z']: undo,
+    KEY_ACTION['CTRL_R']: redo,
+    KEY_ACTION['CTRL_B']: set_mark,
+    KEY_ACTION['CTRL_C']: copy_selection,
+    KEY_ACTION['CTRL_X']: cut_selection,
+    KEY_ACTION['CTRL_V']: paste_clipboard,
+    KEY_ACTION['BACKSPACE']: delete_char,
+    KEY_ACTION['CTRL_H']: delete_char,
+    KEY_ACTION['DEL_KEY']: delete_char,
+}
+
 def terminal_process_keypress():
     quit_times = 3
     while True:
         refresh_screen()
         key = read_key()
 
-        if key == KEY_ACTION['ENTER']:
-            insert_newline()
+        handler = KEY_HANDLERS.get(key)
+        if handler is not None:
+            handler()
         elif key == KEY_ACTION['CTRL_Q']:
             if E.modified and quit_times > 0:
                 set_status_message(f"Warning: Unsaved changes. Hold Ctrl-Q to to quit.")
@@ -1000,41 +1585,17 @@ def terminal_process_keypress():
                 continue
             sys.stdout.write("\x1b[2J\x1b[H\x1b[?25h") # Clear screen, home, show cursor
             sys.exit(0)
-        elif key == KEY_ACTION['CTRL_S']:
-            save_file_terminal()
-        elif key == KEY_ACTION['CTRL_A']:
-            save_file_terminal(save_as=True)
-        elif key == KEY_ACTION['CTRL_O']:
-            open_file_terminal()
-        elif key == KEY_ACTION['CTRL_Z']:
-            undo()
-        elif key == KEY_ACTION['CTRL_R']:
-            redo()
-        elif key == KEY_ACTION['CTRL_B']:
-            set_mark()
-        elif key == KEY_ACTION['CTRL_C']:
-            copy_selection()
-        elif key == KEY_ACTION['CTRL_X']:
-            cut_selection()
-        elif key == KEY_ACTION['CTRL_V']:
-            paste_clipboard()
-        elif key == KEY_ACTION['BACKSPACE'] or key == KEY_ACTION['CTRL_H'] or key == KEY_ACTION['DEL_KEY']:
-            delete_char()
         elif key in (KEY_ACTION['ARROW_UP'], KEY_ACTION['ARROW_DOWN'], KEY_ACTION['ARROW_LEFT'], KEY_ACTION['ARROW_RIGHT']):
             move_cursor(key)
         elif key == KEY_ACTION['PAGE_UP'] or key == KEY_ACTION['PAGE_DOWN']:
-            times = E.screen_rows
-            direction = KEY_ACTION['ARROW_UP'] if key == KEY_ACTION['PAGE_UP'] else KEY_ACTION['ARROW_DOWN']
-            while times:
-                move_cursor(direction)
-                times -= 1
+            move_page(key)
         elif key not in (KEY_ACTION['ESC'], KEY_ACTION['CTRL_L']) and key < 1000 and key >= 32:
             insert_char(key)
         quit_times = 3
         
 
 def handle_resize(signum, frame):
-    E.update_screen_size()
+    E.update_screen_size() # Also marks every screen row for redraw
     if E.cursor_y > E.screen_rows - 1:
         E.cursor_y = E.screen_rows - 1
     if E.cursor_x > E.screen_cols - 1:
@@ -1042,11 +1603,13 @@ def handle_resize(signum, frame):
     refresh_screen()
 
 # GUI Mode
+SAVE_BLOCK_LINES = 4096  # Lines fetched from the Text widget per get() when saving
+
 class GUIEditor:
     def __init__(self, root):
         self.root = root
         self.root.title("NovaEdit GUI")
-        self.menu = Menu(root)
+        self.menu = tk.Menu(root)
         root.config(menu=self.menu)
 
         # --- OS-Aware Accelerator STRINGS ---
@@ -1062,7 +1625,7 @@ class GUIEditor:
             self.root.bind('<Control-y>', self.safe_redo)
         # --- END OS-Awareness ---
 
-        file_menu = Menu(self.menu, tearoff=0)
+        file_menu = tk.Menu(self.menu, tearoff=0)
         self.menu.add_cascade(label="File", menu=file_menu)
         file_menu.add_command(label="New Tab", command=self.new_tab, accelerator=f"{mod_key}+N")
         file_menu.add_command(label="Open", command=self.open_file_gui, accelerator=f"{mod_key}+O")
@@ -1072,7 +1635,7 @@ class GUIEditor:
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.on_exit)
 
-        edit_menu = Menu(self.menu, tearoff=0)
+        edit_menu = tk.Menu(self.menu, tearoff=0)
         self.menu.add_cascade(label="Edit", menu=edit_menu)
         edit_menu.add_command(label="Undo", command=self.safe_undo, accelerator=f"{mod_key}+Z")
         edit_menu.add_command(label="Redo", command=self.safe_redo, accelerator=redo_accel)
@@ -1096,37 +1659,55 @@ class GUIEditor:
         if text:
             try:
                 text.edit_undo()
-            except TclError:
-                pass # Stack is empty
+            except tk.TclError:
+                return # Stack is empty
+            self.schedule_highlight(self.get_current_tab_id(), 1)
 
     def safe_redo(self, event=None):
         text = self.get_current_text()
         if text:
             try:
                 text.edit_redo()
-            except TclError:
-                pass # Stack is empty
+            except tk.TclError:
+                return # Stack is empty
+            self.schedule_highlight(self.get_current_tab_id(), 1)
 
     def new_tab(self, event=None):
         self.add_tab("untitled.txt")
 
     def add_tab(self, tab_name, file_name=None):
-        frame = Frame(self.notebook)
-        text = Text(frame, wrap="none", undo=True, font=("Courier", 12))
+        frame = tk.Frame(self.notebook)
+        text = tk.Text(frame, wrap="none", undo=True, font=("Courier", 12))
         
-        yscroll = Scrollbar(frame, orient=VERTICAL, command=text.yview)
-        xscroll = Scrollbar(frame, orient=HORIZONTAL, command=text.xview)
-        text.config(yscrollcommand=yscroll.set, xscrollcommand=xscroll.set)
+        yscroll = tk.Scrollbar(frame, orient=tk.VERTICAL, command=text.yview)
+        xscroll = tk.Scrollbar(frame, orient=tk.HORIZONTAL, command=text.xview)
+        # Newly scrolled-in lines get highlighted as they appear
+        text.config(yscrollcommand=lambda first, last: self.on_text_scroll(id(frame), yscroll, first, last),
+                    xscrollcommand=xscroll.set)
         
-        yscroll.pack(side=RIGHT, fill=Y)
-        xscroll.pack(side=BOTTOM, fill=X)
+        yscroll.pack(side=tk.RIGHT, fill=tk.Y)
+        xscroll.pack(side=tk.BOTTOM, fill=tk.X)
         text.pack(fill="both", expand=True)
+
+        # Highlight tags only ever change their ranges, so configure them once
+        for hl in range(HL_NONPRINT, len(TK_COLOR_TABLE)):
+            text.tag_config(TK_TAG_NAMES[hl], foreground=syntax_to_tk_color(hl))
         
         self.notebook.add(frame, text=tab_name)
         syntax = select_syntax_highlight(file_name or tab_name)
-        self.tabs[id(frame)] = {'text': text, 'file_name': file_name, 'modified': False, 'syntax': syntax}
+        self.tabs[id(frame)] = {'frame': frame, 'text': text, 'file_name': file_name, 'modified': False, 'syntax': syntax,
+                                'hl_states': [False],   # open_comment state at the start of each line
+                                'hl_tagged': bytearray(), # 1 for lines whose tags are up to date
+                                'hl_used': set(),         # highlight tags added since the last reset
+                                'hl_end': 2,              # line number of END at the last edit pass
+                                'hl_pending': False,      # a highlight pass is queued for idle time
+                                'hl_dirty': None,         # merged (dirty_line, dirty_end) of the queued edits
+                                'hl_insert_line': 1,      # INSERT line at the previous key release
+                                'hl_press_line': None}    # first line the keys pressed since then may edit
         
+        text.bind("<KeyPress>", self.on_key_press)
         text.bind("<KeyRelease>", self.on_key_release)
+        text.bind("<<PasteSelection>>", self.on_paste_selection)
         text.bind("<Button-1>", self.on_key_release) # For cursor move
         
         # --- Bind menu shortcuts directly to the text widget ---
@@ -1148,13 +1729,13 @@ class GUIEditor:
         if file_name:
             self.load_file_to_tab(id(frame), file_name)
             
-        self.highlight_syntax(id(frame))
+        self.schedule_highlight(id(frame))
         self.notebook.select(frame)
 
     def on_tab_change(self, event):
         if not self.notebook.tabs():
             return
-        self.highlight_syntax(self.get_current_tab_id())
+        self.schedule_highlight(self.get_current_tab_id())
 
     def get_current_tab_id(self):
         try:
@@ -1162,7 +1743,7 @@ class GUIEditor:
             if not current_tab:
                 return None
             return id(self.notebook.nametowidget(current_tab))
-        except (TclError, KeyError):
+        except (tk.TclError, KeyError):
             return None
 
     def get_current_text(self):
@@ -1179,10 +1760,10 @@ class GUIEditor:
 
     def load_file_to_tab(self, tab_id, file_name):
         text = self.tabs[tab_id]['text']
-        text.delete(1.0, END)
+        text.delete(1.0, tk.END)
         try:
             with open(file_name, 'r', encoding='utf-8') as f:
-                text.insert(END, f.read())
+                text.insert(tk.END, f.read())
         except Exception as e:
             messagebox.showerror("Error", f"Failed to read file: {e}")
             self.close_tab_by_id(tab_id) # Close tab if file read fails
@@ -1192,7 +1773,7 @@ class GUIEditor:
         self.tabs[tab_id]['modified'] = False
         self.tabs[tab_id]['syntax'] = select_syntax_highlight(file_name)
         self.update_tab_title(tab_id)
-        self.highlight_syntax(tab_id)
+        self.reset_highlight(tab_id)
         text.edit_reset() # Clear undo stack
 
     def open_file_gui(self, event=None):
@@ -1201,11 +1782,27 @@ class GUIEditor:
             # Check if file is already open
             for tab_id, data in self.tabs.items():
                 if data['file_name'] == file_name:
-                    frame = self.notebook.nametowidget([f for f in self.notebook.tabs() if id(self.notebook.nametowidget(f)) == tab_id][0])
-                    self.notebook.select(frame)
+                    self.notebook.select(data['frame'])
                     return
             self.add_tab(os.path.basename(file_name), file_name)
 
+    def write_text(self, text, f):
+        """
+        Write the contents of a Text widget to `f` a block of lines at a time, so
+        the whole document is never one Python string. Trailing newlines are dropped.
+        """
+        end = int(text.index(tk.END).split('.')[0])
+        newlines = ''  # Held back until some text follows them
+        for line in range(1, end, SAVE_BLOCK_LINES):
+            block = text.get(f"{line}.0", f"{line + SAVE_BLOCK_LINES}.0")
+            stripped = block.rstrip('\n')
+            if stripped:
+                f.write(newlines)
+                f.write(stripped)
+                newlines = block[len(stripped):]
+            else:
+                newlines += block
+
     def save_file_gui(self, event=None):
         tab_id = self.get_current_tab_id()
         if not tab_id: return
@@ -1214,7 +1811,7 @@ class GUIEditor:
             text = self.tabs[tab_id]['text']
             try:
                 with open(file_name, 'w', encoding='utf-8') as f:
-                    f.write(text.get(1.0, END).rstrip('\n'))
+                    self.write_text(text, f)
                 self.tabs[tab_id]['modified'] = False
                 self.update_tab_title(tab_id)
             except Exception as e:
@@ -1230,12 +1827,12 @@ class GUIEditor:
             text = self.tabs[tab_id]['text']
             try:
                 with open(file_name, 'w', encoding='utf-8') as f:
-                    f.write(text.get(1.0, END).rstrip('\n'))
+                    self.write_text(text, f)
                 self.tabs[tab_id]['file_name'] = file_name
                 self.tabs[tab_id]['modified'] = False
                 self.tabs[tab_id]['syntax'] = select_syntax_highlight(file_name)
                 self.update_tab_title(tab_id)
-                self.highlight_syntax(tab_id) # Re-highlight for new extension
+                self.reset_highlight(tab_id) # Re-highlight for new extension
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to save file: {e}")
 
@@ -1246,12 +1843,11 @@ class GUIEditor:
 
     def close_tab_by_id(self, tab_id):
         if self.tabs[tab_id]['modified']:
-            self.notebook.select(self.notebook.nametowidget([f for f in self.notebook.tabs() if id(self.notebook.nametowidget(f)) == tab_id][0]))
+            self.notebook.select(self.tabs[tab_id]['frame'])
             if not messagebox.askyesno("Unsaved Changes", f"Close '{self.notebook.tab('current')['text']}' without saving?"):
                 return False # Indicate close was canceled
         
-        current_tab_widget = self.notebook.nametowidget([f for f in self.notebook.tabs() if id(self.notebook.nametowidget(f)) == tab_id][0])
-        self.notebook.forget(current_tab_widget)
+        self.notebook.forget(self.tabs[tab_id]['frame'])
         del self.tabs[tab_id]
         if not self.notebook.tabs():
             self.root.quit()
@@ -1274,93 +1870,245 @@ class GUIEditor:
             title += "*"
         
         try:
-            frame = self.notebook.nametowidget([f for f in self.notebook.tabs() if id(self.notebook.nametowidget(f)) == tab_id][0])
-            self.notebook.tab(frame, text=title)
-        except (IndexError, TclError):
+            self.notebook.tab(self.tabs[tab_id]['frame'], text=title)
+        except tk.TclError:
             pass # Tab was already closed
 
+    def on_key_press(self, event):
+        # Runs before the Text class binding, so this is where the edit starts:
+        # the cursor, or the start of a selection the key replaces
+        tab_id = self.get_current_tab_id()
+        if not tab_id: return
+        tab = self.tabs[tab_id]
+        text = tab['text']
+        line = int(text.index(tk.INSERT).split('.')[0])
+        sel = text.tag_ranges(tk.SEL)
+        if sel:
+            line = min(line, int(str(sel[0]).split('.')[0]))
+        if tab['hl_press_line'] is not None:
+            line = min(line, tab['hl_press_line']) # Key repeat
+        tab['hl_press_line'] = line
+
+    def on_paste_selection(self, event):
+        # Middle-click paste edits the text without a key release
+        tab_id = self.get_current_tab_id()
+        if not tab_id: return
+        tab = self.tabs[tab_id]
+        if not tab['modified']:
+            tab['modified'] = True
+            self.update_tab_title(tab_id)
+        line = int(tab['text'].index(f"@{event.x},{event.y}").split('.')[0])
+        self.schedule_highlight(tab_id, line)
+
     def on_key_release(self, event):
         tab_id = self.get_current_tab_id()
         if not tab_id: return
+        tab = self.tabs[tab_id]
         
-        # Check if key is a modification key
-        if event.keysym not in ('Shift_L', 'Shift_R', 'Control_L', 'Control_R', 'Alt_L', 'Alt_R', 'Up', 'Down', 'Left', 'Right', 'Command_L', 'Command_R'):
-             if not self.tabs[tab_id]['modified']:
-                self.tabs[tab_id]['modified'] = True
+        # Check if key is a modification key (no event means a programmatic edit)
+        if event is None or event.keysym not in ('Shift_L', 'Shift_R', 'Control_L', 'Control_R', 'Alt_L', 'Alt_R', 'Up', 'Down', 'Left', 'Right', 'Command_L', 'Command_R'):
+             if not tab['modified']:
+                tab['modified'] = True
                 self.update_tab_title(tab_id)
-        
-        # We can be smarter and only highlight the current line, but for simplicity:
-        self.highlight_syntax(tab_id)
 
-    def highlight_syntax(self, tab_id):
+        # Plain typing only touches the lines between where the keys started editing
+        # and the current cursor; anything with a modifier (paste, undo, redo...) may
+        # have edited anywhere.
+        insert_line = int(tab['text'].index(tk.INSERT).split('.')[0])
+        if event is None or event.state & 0x000C: # Control or Mod1 (Command/Alt)
+            dirty_line, dirty_end = 1, None
+        else:
+            dirty_line = min(insert_line, tab['hl_insert_line'])
+            dirty_end = max(insert_line, tab['hl_insert_line'])
+            if tab['hl_press_line'] is not None:
+                dirty_line = min(dirty_line, tab['hl_press_line'])
+        tab['hl_insert_line'] = insert_line
+        tab['hl_press_line'] = None
+        self.schedule_highlight(tab_id, dirty_line, dirty_end)
+
+    def on_text_scroll(self, tab_id, scrollbar, first, last):
+        scrollbar.set(first, last)
+        if tab_id in self.tabs:
+            self.schedule_highlight(tab_id)
+
+    def schedule_highlight(self, tab_id, dirty_line=None, dirty_end=None):
+        """
+        Highlight the tab once Tk is idle, so a burst of key repeats or scroll
+        events costs a single pass. Their dirty lines are merged until then.
+        """
         if not tab_id: return
-        text = self.tabs[tab_id]['text']
-        syntax = self.tabs[tab_id]['syntax']
+        tab = self.tabs[tab_id]
+        if dirty_line is not None:
+            if tab['hl_dirty'] is not None:
+                prev_line, prev_end = tab['hl_dirty']
+                dirty_line = min(dirty_line, prev_line)
+                dirty_end = None if dirty_end is None or prev_end is None else max(dirty_end, prev_end)
+            tab['hl_dirty'] = (dirty_line, dirty_end)
+        if not tab['hl_pending']:
+            tab['hl_pending'] = True
+            self.root.after_idle(self.run_pending_highlight, tab_id)
+
+    def run_pending_highlight(self, tab_id):
+        tab = self.tabs.get(tab_id)
+        if tab is None: return # Closed in the meantime
+        dirty_line, dirty_end = tab['hl_dirty'] or (None, None)
+        tab['hl_pending'] = False
+        tab['hl_dirty'] = None
+        self.highlight_syntax(tab_id, dirty_line, dirty_end)
+
+    def reset_highlight(self, tab_id):
+        """Drop every highlight tag of the tab, e.g. after its syntax changed."""
+        tab = self.tabs[tab_id]
+        for tag in tab['hl_used']:
+            tab['text'].tag_remove(tag, "1.0", tk.END)
+        tab['hl_used'].clear()
+        tab['hl_states'][1:] = []
+        tab['hl_tagged'].clear()
+        tab['hl_end'] = int(tab['text'].index(tk.END).split('.')[0])
+        self.highlight_syntax(tab_id)
 
-        # Clear all old tags
-        for tag in text.tag_names():
-            if tag != "sel": # Don't remove selection tag
-                text.tag_remove(tag, "1.0", "end")
+    def highlight_syntax(self, tab_id, dirty_line=None, dirty_end=None):
+        """
+        Tag the visible lines of a tab that aren't tagged yet. `dirty_line` is the
+        first line an edit may have changed: everything from there on is stale,
+        unless the edit stayed within lines `dirty_line`..`dirty_end`.
+        """
+        if not tab_id: return
+        tab = self.tabs[tab_id]
+        text = tab['text']
+        syntax = tab['syntax']
+        states = tab['hl_states']  # states[i] is the open_comment state entering line i + 1
+        tagged = tab['hl_tagged']  # tagged[i] is set once line i + 1 has current tags
+
+        first = int(text.index("@0,0").split('.')[0])
+        last = int(text.index(f"@0,{text.winfo_height()}").split('.')[0])
+        end = int(text.index(tk.END).split('.')[0])
+        if dirty_line is None and end != tab['hl_end']:
+            # Lines were added or removed by an edit that wasn't reported (yet),
+            # e.g. a key still held down
+            dirty_line = tab['hl_press_line'] or 1
+        if dirty_line is not None:
+            if dirty_end is not None and end == tab['hl_end'] and first <= dirty_line and dirty_end <= last:
+                # Same line count and the edit is in view: only the edited lines are
+                # stale, the walk below catches it if their end state changed
+                tagged[dirty_line - 1:dirty_end] = bytes(len(tagged[dirty_line - 1:dirty_end]))
+            else:
+                del states[dirty_line:]
+                del tagged[dirty_line - 1:]
+            # Only passes that carry an edit may record the line count: a scroll
+            # pass can run between a KeyPress and its KeyRelease
+            tab['hl_end'] = end
 
         if syntax is None:
             return
 
-        content = text.get("1.0", END).rstrip('\n')
-        lines = content.split('\n')
-        open_comment = False # Changed from 0 to False for clarity
-        
-        for line_num, line in enumerate(lines, 1):
-            
-            # --- UPDATED: Call shared function ---
-            highlight, open_comment = get_syntax_highlighting(line, syntax, open_comment)
-            
-            for col, hl in enumerate(highlight):
-                if hl != HL_NORMAL:
-                    color = syntax_to_tk_color(hl)
-                    tag_name = f"hl_{hl}"
-                    start = f"{line_num}.{col}"
-                    end = f"{line_num}.{col+1}"
-                    text.tag_add(tag_name, start, end)
-                    text.tag_config(tag_name, foreground=color)
+        if len(tagged) < last:
+            tagged.extend(bytes(last - len(tagged)))
+        stale = [ln for ln in range(first, last + 1) if not tagged[ln - 1]]
+        if not stale:
+            return
+
+        # Walk from the first line whose incoming state is unknown (or the first
+        # stale one) down to the bottom of the view, tagging only stale lines
+        start = min(len(states), stale[0])
+        lines = text.get(f"{start}.0", f"{last}.end").split('\n')
+        open_comment = states[start - 1]
+        ranges = [[] for _ in TK_TAG_NAMES]  # ranges[hl] = [start, end, start, end, ...]
+        retagged = []
+        find_runs = HL_TAG_RUN_RE.finditer
+        walk_end = stale[-1]
+        results = []
+        for line_num in range(start, start + len(lines)):
+            if line_num > walk_end:
+                break
+            if line_num - start == len(results):
+                if line_num < first:
+                    # Lines above the view only hand their comment state down
+                    states_above = get_open_comment_states(lines[:first - start], syntax, open_comment)
+                    results += [(None, state) for state in states_above]
+                else:
+                    # Highlight up to walk_end in one pass; again if the walk gets extended
+                    results += get_syntax_highlighting_lines(lines[line_num - start:walk_end - start + 1], syntax, open_comment)
+            highlight, open_comment = results[line_num - start]
+            if line_num >= len(states):
+                states.append(open_comment)
+            elif states[line_num] != open_comment:
+                # The state flowing out of this line changed, so are all lines below
+                del states[line_num + 1:]
+                states[line_num] = open_comment
+                tagged[line_num:] = bytes(len(tagged) - line_num)
+                walk_end = last
+            if line_num < first or tagged[line_num - 1]:
+                continue
+            tagged[line_num - 1] = 1
+            retagged.append(line_num)
+
+            # One index pair per run of same-class characters
+            prefix = f"{line_num}."
+            for run in find_runs(highlight):
+                run_start, run_end = run.span()
+                ranges[highlight[run_start]] += (prefix + str(run_start), prefix + str(run_end))
+
+        # Clear what stale lines were tagged with before, a contiguous block at a
+        # time, skipping tags this tab never used
+        used = tab['hl_used']
+        block_start = prev = retagged[0]
+        for ln in retagged[1:] + [None]:
+            if ln != prev + 1:
+                for tag in used:
+                    text.tag_remove(tag, f"{block_start}.0", f"{prev + 1}.0")
+                block_start = ln
+            prev = ln
+
+        # tag_add takes any number of ranges, so it's one Tcl call per tag
+        for tag, indices in zip(TK_TAG_NAMES, ranges):
+            if indices:
+                text.tag_add(tag, *indices)
+                used.add(tag)
 
     # --- REMOVED: get_highlight_for_line (now uses shared function) ---
 
     def find_replace_dialog(self, event=None):
-        top = Toplevel(self.root)
+        top = tk.Toplevel(self.root)
         top.title("Find/Replace")
 
-        Label(top, text="Find:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
-        find_entry = Entry(top)
+        tk.Label(top, text="Find:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        find_entry = tk.Entry(top)
         find_entry.grid(row=0, column=1, columnspan=2, padx=5, pady=5, sticky="ew")
 
-        Label(top, text="Replace:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
-        replace_entry = Entry(top)
+        tk.Label(top, text="Replace:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        replace_entry = tk.Entry(top)
         replace_entry.grid(row=1, column=1, columnspan=2, padx=5, pady=5, sticky="ew")
 
         current_text_widget = self.get_current_text()
         if not current_text_widget:
             top.destroy()
             return
+        tab_id = self.get_current_tab_id() # The dialog stays on this tab even if another is selected
             
-        current_text_widget.tag_remove("find_match", "1.0", END)
         last_find_pos = "1.0"
 
-        def find_next():
+        def mark_replaced(first_line):
+            if not self.tabs[tab_id]['modified']:
+                self.tabs[tab_id]['modified'] = True
+                self.update_tab_title(tab_id)
+            self.schedule_highlight(tab_id, first_line) # Nothing above the first replacement changed
+
+        def find_next(clear_sel=True):
             nonlocal last_find_pos
             text = current_text_widget
             search = find_entry.get()
             if not search:
                 return
                 
-            text.tag_remove("find_match", "1.0", END)
-            start = text.index(INSERT)
+            start = text.index(tk.INSERT)
             if start == last_find_pos:
                 start = f"{start}+1c" # Move past the last match
                 
-            pos = text.search(search, start, stopindex=END)
+            pos = text.search(search, start, stopindex=tk.END)
             if not pos:
                 # Loop back to top
-                pos = text.search(search, "1.0", stopindex=END)
+                pos = text.search(search, "1.0", stopindex=tk.END)
                 if not pos:
                     messagebox.showinfo("Find", "No more matches found")
                     last_find_pos = "1.0"
@@ -1369,10 +2117,11 @@ class GUIEditor:
             end = f"{pos}+{len(search)}c"
             last_find_pos = end
             
-            text.tag_remove(SEL, "1.0", END)
-            text.tag_add(SEL, pos, end)
-            text.mark_set(INSERT, end)
-            text.see(INSERT)
+            if clear_sel:
+                text.tag_remove(tk.SEL, "1.0", tk.END)
+            text.tag_add(tk.SEL, pos, end)
+            text.mark_set(tk.INSERT, end)
+            text.see(tk.INSERT)
             text.focus()
 
         def replace():
@@ -1382,12 +2131,14 @@ class GUIEditor:
             if not search:
                 return
                 
-            if text.tag_ranges(SEL):
-                start, end = text.tag_ranges(SEL)
-                if text.get(start, end) == search:
-                    text.delete(start, end)
-                    text.insert(start, repl)
-                    text.tag_remove(SEL, "1.row.0", END)
+            sel = text.tag_ranges(tk.SEL)
+            if len(sel) == 2 and text.get(*sel) == search:
+                start, end = sel
+                text.delete(start, end)
+                text.insert(start, repl)
+                mark_replaced(int(str(start).split('.')[0]))
+                find_next(clear_sel=False) # Deleting the match took the selection with it
+                return
             find_next()
 
         def replace_all():
@@ -1397,30 +2148,41 @@ class GUIEditor:
             if not search:
                 return
                 
-            content = text.get("1.0", END)
-            if search not in content:
+            count = tk.IntVar(top)
+            pos = text.search(search, "1.0", stopindex=tk.END, count=count)
+            if not pos:
                 messagebox.showinfo("Replace All", "No matches found")
                 return
-
-            new_content = content.replace(search, repl)
-            text.delete("1.0", END)
-            text.insert("1.0", new_content)
-            self.on_key_release(None) # Trigger modified state and highlighting
-
-        Button(top, text="Find Next", command=find_next).grid(row=2, column=0, padx=5, pady=10)
-        Button(top, text="Replace", command=replace).grid(row=2, column=1, padx=5, pady=10)
-        Button(top, text="Replace All", command=replace_all).grid(row=2, column=2, padx=5, pady=10)
+            first_line = int(pos.split('.')[0])
+
+            # Replace match by match, as a single undo step
+            text.edit_separator()
+            text.config(autoseparators=False)
+            while pos:
+                text.replace(pos, f"{pos}+{count.get()}c", repl)
+                pos = text.search(search, f"{pos}+{len(repl)}c", stopindex=tk.END, count=count)
+            text.config(autoseparators=True)
+            text.edit_separator()
+            mark_replaced(first_line)
+
+        tk.Button(top, text="Find Next", command=find_next).grid(row=2, column=0, padx=5, pady=10)
+        tk.Button(top, text="Replace", command=replace).grid(row=2, column=1, padx=5, pady=10)
+        tk.Button(top, text="Replace All", command=replace_all).grid(row=2, column=2, padx=5, pady=10)
         
         top.grid_columnconfigure(1, weight=1)
         top.grid_columnconfigure(2, weight=1)
         
         def on_close():
-            current_text_widget.tag_remove(SEL, "1.0", END)
+            current_text_widget.tag_remove(tk.SEL, "1.0", tk.END)
             top.destroy()
         top.protocol("WM_DELETE_WINDOW", on_close)
 
 def run_gui():
-    root = Tk()
+    global tk, filedialog, messagebox, ttk, platform
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
+    import platform # For OS-specific key bindings
+    root = tk.Tk()
     app = GUIEditor(root)
     root.mainloop()
 